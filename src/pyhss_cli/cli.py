@@ -1,22 +1,35 @@
 #!/usr/bin/env python3
 
+from __future__ import annotations
+
 import logging
-import re
-import sys
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING
 
 import click
-import httpx
+import orjson
+
+# httpx is imported where it's used, importing it takes longer than
+# a whole --help invocation otherwise.
+# pylint: disable=import-outside-toplevel
+if TYPE_CHECKING:
+    import httpx
 
 VERSION = '0.0.1'
 LOG = logging.getLogger()
 
+# translate() tables deleting all valid characters, leaving only the invalid ones
+_DELETE_DIGITS = str.maketrans('', '', '0123456789')
+_DELETE_HEX_DIGITS = str.maketrans('', '', '0123456789abcdefABCDEF')
+# valid key lengths in hex characters
+_VALID_KEY_LENS = frozenset((16, 32))
+
 def validate_imsi(_ctx, _param, value):
     if len(value) != 15:
         raise click.BadParameter("IMSI must be 15 digits long")
 
-    valid = '0123456789'
-    contains_invalid = [x for x in value if x not in valid]
-    if contains_invalid:
+    if not (value.isascii() and value.isdigit()):
+        contains_invalid = value.translate(_DELETE_DIGITS)
         raise click.BadParameter(f"Contains the following invalid IMSI characters: {contains_invalid}")
 
     return value
@@ -25,6 +38,10 @@ def validate_hex(_ctx, _param, value):
     if len(value) % 2 != 0:
         raise click.BadParameter("Hexstrings must have even amount of digits.")
 
+    contains_invalid = value.translate(_DELETE_HEX_DIGITS)
+    if contains_invalid:
+        raise click.BadParameter(f"Contains the following invalid hex characters: {contains_invalid}")
+
     return value
 
 def validate_key(ctx, param, value):
@@ -33,17 +50,11 @@ def validate_key(ctx, param, value):
 
     value = validate_hex(ctx, param, value)
 
-    valid = [16, 32]
-    if len(value) not in valid:
-        raise click.BadParameter(f"Must have 128 or 256 bit length. Given {int(len(value) / 2 * 8)} bits")
+    if len(value) not in _VALID_KEY_LENS:
+        raise click.BadParameter(f"Must have 128 or 256 bit length. Given {len(value) * 4} bits")
 
     return value
 
-def get_headers(ctx: click.Context) -> dict:
-    if ctx.obj['APIKEY']:
-        return {'Provisioning-Key': ctx.obj['APIKEY']}
-    return {}
-
 CONTEXT_SETTINGS = {'show_default': True}
 
 @click.group(context_settings=CONTEXT_SETTINGS)
@@ -56,6 +67,22 @@ def cli(ctx, api, api_key):
     ctx.obj['API'] = api
     ctx.obj['APIKEY'] = api_key
 
+def get_client(ctx: click.Context) -> httpx.Client:
+    """ Return the client shared by all requests of this invocation, it's created on first use """
+    import httpx
+
+    ctx = ctx.find_root()
+    if 'CLIENT' not in ctx.obj:
+        # A single client keeps the connection to PyHSS alive.
+        # With https, HTTP/2 is negotiated if PyHSS supports it to multiplex concurrent requests.
+        ctx.obj['CLIENT'] = httpx.Client(
+                headers={'Provisioning-Key': ctx.obj['APIKEY']} if ctx.obj['APIKEY'] else {},
+                base_url=ctx.obj['API'],
+                http2=True,
+                limits=httpx.Limits(max_keepalive_connections=10, keepalive_expiry=30))
+        ctx.call_on_close(ctx.obj['CLIENT'].close)
+    return ctx.obj['CLIENT']
+
 
 @cli.command()
 @click.argument('imsi', type=str, callback=validate_imsi)
@@ -79,223 +106,365 @@ def add_subscriber(ctx, imsi, ki, opc, op, sqn, iccid, msisdn, default_apn, apn,
     if not opc and not op:
         raise click.BadParameter("Require either OP or OPc!")
 
-    with httpx.Client(headers=get_headers(ctx)) as client:
-        api = ctx.obj['API']
+    client = get_client(ctx)
 
-        # get default APN
-        apn_obj = get_apn(client, api, default_apn)
-        if not apn_obj:
-            click.echo(f"Could not find the default apn '{default_apn}'. Please add it first via add-apn.")
-            sys.exit(1)
+    # The prechecks are independent of each other, run them concurrently.
+    # The APN list is fetched once and all APNs are resolved locally.
+    with ThreadPoolExecutor(max_workers=3) as executor:
+        apns_future = executor.submit(list_apns_dict, client)
+        old_sub_future = executor.submit(get_subscriber, client, imsi)
+        old_auc_future = executor.submit(get_auc, client, imsi)
+        apns = apns_future.result()
+        old_sub_entry = old_sub_future.result()
+        old_auc_entry = old_auc_future.result()
 
-        default_apn_id = apn_obj['apn_id']
+    try:
+        sub_obj = provision_subscriber(
+                client, apns, old_sub_entry, old_auc_entry,
+                imsi=imsi, ki=ki, opc=opc, op=op, sqn=sqn, iccid=iccid, msisdn=msisdn,
+                default_apn=default_apn, apn=apn, remove_old_auc=remove_old_auc)
+    except RuntimeError as exp:
+        raise click.ClickException(str(exp)) from exp
+
+    click.echo(f'Subscriber {imsi} added as subscriber id {sub_obj["subscriber_id"]}')
+
+def provision_subscriber(client: httpx.Client, apns: dict, old_sub_entry: dict | None, old_auc_entry: dict | None,
+                         imsi, ki, opc, op, sqn, iccid, msisdn, default_apn, apn, remove_old_auc) -> dict:
+    """ Add a prechecked subscriber to the AUC and subscriber database
+
+        apns is the APN dict of list_apns_dict(), old_sub_entry and old_auc_entry
+        the already present entries of the IMSI.
+        Returns the new subscriber object, raises RuntimeError on failures.
+    """
+    import httpx
 
-        # get apn_list
-        apn_list = []
-        for single_apn in apn:
-            apn_obj = get_apn(client, api, single_apn)
-            if apn_obj:
-                apn_list.append(apn_obj['apn_id'])
-            else:
-                click.echo(f"Could not find the given --apn '{single_apn}'. Please add it first via add-apn.")
-                sys.exit(1)
-        LOG.debug("Created APN list {apn_list} (without default_apn)")
-
-        # add subscriber to the AUC
-        old_sub_entry = get_subscriber(client, api, imsi)
-        if old_sub_entry:
-            click.echo("Subscriber already exist in subscriber database!")
-            sys.exit(1)
-
-        auc_entry = {
-            'ki': ki,
-            'sqn': sqn,
-            'amf': '8000', # AMF for E-UTRAN requires 0x8000, even this shouldn't be part of the subscriber record
-            'imsi': imsi,
-        }
-
-        if iccid:
-            auc_entry['iccid'] = iccid
-
-        if opc:
-            auc_entry['opc'] = opc
-
-        if op:
-            auc_entry['op'] = op
-
-        old_auc_entry = get_auc(client, api, imsi)
-        if old_auc_entry:
-            if remove_old_auc:
-                delete_auc(client, api, old_auc_entry['auc_id'])
-            else:
-                click.echo(f"Subscriber {imsi} already exist in AUC database! Use --remove-old-auc to override")
-                sys.exit(1)
+    # get default APN
+    apn_obj = apns.get(default_apn)
+    if not apn_obj:
+        raise RuntimeError(f"Could not find the default apn '{default_apn}'. Please add it first via add-apn.")
 
-        try:
-            resp = client.put(f'{api}/auc/', json=auc_entry)
-            resp_obj = resp.json()
-            resp.raise_for_status()
-            auc_id = resp_obj['auc_id']
-        except httpx.HTTPStatusError as exp:
-            click.echo(f"Failed to add the subscriber {imsi} to the AUC, PyHSS responded with HTTP {exp.response.status_code} {exp.response.content}")
-            sys.exit(1)
-
-        if resp_obj is None:
-            click.echo(f"Failed to add the subscriber {imsi} to the AUC, PyHSS responded with empty json")
-
-        # Convert apn_list to str
-        apn_list = [str(x) for x in apn_list]
-        apn_list = ','.join(apn_list)
-        subscriber_entry = {
-            'auc_id': auc_id,
-            'imsi': imsi,
-            'enabled': True,
-            'default_apn': default_apn_id,
-            'roaming_enabled': True,
-            'apn_list': apn_list,
-        }
-
-        if msisdn:
-            subscriber_entry['msisdn'] = msisdn
+    default_apn_id = apn_obj['apn_id']
 
-        try:
-            resp = client.put(f'{api}/subscriber/', json=subscriber_entry)
-            sub_obj = resp.json()
-            resp.raise_for_status()
-        except httpx.HTTPStatusError as exp:
-            click.echo(f"Failed to add the subscriber to the AUC, PyHSS responded with HTTP {exp.response.status_code} {exp.response.content}")
-            sys.exit(1)
+    # get apn_list
+    apn_list = []
+    for single_apn in apn:
+        apn_obj = apns.get(single_apn)
+        if apn_obj:
+            apn_list.append(apn_obj['apn_id'])
+        else:
+            raise RuntimeError(f"Could not find the given --apn '{single_apn}'. Please add it first via add-apn.")
+    LOG.debug("Created APN list {apn_list} (without default_apn)")
+
+    # add subscriber to the AUC
+    if old_sub_entry:
+        raise RuntimeError("Subscriber already exist in subscriber database!")
+
+    auc_entry = {
+        'ki': ki,
+        'sqn': sqn,
+        'amf': '8000', # AMF for E-UTRAN requires 0x8000, even this shouldn't be part of the subscriber record
+        'imsi': imsi,
+    }
 
-        click.echo(f'Subscriber {imsi} added as subscriber id {sub_obj["subscriber_id"]}')
+    if iccid:
+        auc_entry['iccid'] = iccid
 
-@cli.command()
-@click.argument('imsi', type=str, callback=validate_imsi)
-@click.pass_context
-def remove_subscriber(ctx, imsi):
-    with httpx.Client(headers=get_headers(ctx)) as client:
-        api = ctx.obj['API']
+    if opc:
+        auc_entry['opc'] = opc
 
-        subscriber_obj = get_subscriber(client, api, imsi)
-        if not subscriber_obj:
-            click.echo(f"Couldn't find subscriber {imsi}. Does not exist!")
-            sys.exit(1)
+    if op:
+        auc_entry['op'] = op
 
-        try:
-            resp = client.delete(f'{api}/subscriber/{subscriber_obj["subscriber_id"]}')
-            result = resp.json()
-            resp.raise_for_status()
-        except httpx.HTTPStatusError as exp:
-            click.echo(f"Failed to remove subscriber {imsi}, PyHSS responded with HTTP {exp.response.status_code}. {exp.response.content}")
-            sys.exit(1)
-        LOG.debug("Removing subscriber returned %s", result)
+    if old_auc_entry:
+        if remove_old_auc:
+            delete_auc(client, old_auc_entry['auc_id'])
+        else:
+            raise RuntimeError(f"Subscriber {imsi} already exist in AUC database! Use --remove-old-auc to override")
 
-    if failed_result(result):
-        raise RuntimeError(f"Couldn't delete subscriber {imsi} / id {subscriber_obj['subscriber_id']}")
+    try:
+        resp = client.put('/auc/', content=orjson.dumps(auc_entry), headers={'Content-Type': 'application/json'})
+        resp.raise_for_status()
+        resp_obj = orjson.loads(resp.content)
+    except httpx.HTTPStatusError as exp:
+        raise RuntimeError(f"Failed to add the subscriber {imsi} to the AUC, PyHSS responded with HTTP {exp.response.status_code} {exp.response.content}") from exp
+
+    if resp_obj is None:
+        raise RuntimeError(f"Failed to add the subscriber {imsi} to the AUC, PyHSS responded with empty json")
+    auc_id = resp_obj['auc_id']
+
+    # Convert apn_list to str
+    apn_list = ','.join(map(str, apn_list))
+    subscriber_entry = {
+        'auc_id': auc_id,
+        'imsi': imsi,
+        'enabled': True,
+        'default_apn': default_apn_id,
+        'roaming_enabled': True,
+        'apn_list': apn_list,
+    }
+
+    if msisdn:
+        subscriber_entry['msisdn'] = msisdn
 
-def get_subscriber(client, api, imsi) -> dict | None:
     try:
-        resp = client.get(f'{api}/subscriber/imsi/{imsi}')
+        resp = client.put('/subscriber/', content=orjson.dumps(subscriber_entry), headers={'Content-Type': 'application/json'})
         resp.raise_for_status()
-        sub_obj = resp.json()
+        sub_obj = orjson.loads(resp.content)
     except httpx.HTTPStatusError as exp:
-        if exp.response.status_code == 404:
-            return None
-        click.echo(f"Failed to get the subscriber {imsi} from Subscriber, PyHSS responded with HTTP {exp.response.status_code}. {exp.response.content}")
-        raise
+        raise RuntimeError(f"Failed to add the subscriber to the AUC, PyHSS responded with HTTP {exp.response.status_code} {exp.response.content}") from exp
 
     return sub_obj
 
-def get_ims_subscriber(client, api, imsi=None, msisdn=None) -> dict | None:
-    try:
-        if imsi:
-            resp = client.get(f'{api}/ims_subscriber/ims_subscriber_imsi/{imsi}')
-        elif msisdn:
-            resp = client.get(f'{api}/ims_subscriber/ims_subscriber_msisdn/{msisdn}')
-        else:
-            return None
+# json types of the bulk-add-subscribers fields
+_BULK_REQUIRED_FIELDS = ('imsi', 'ki', 'default_apn')
+_BULK_FIELD_TYPES = {
+    'imsi': (str, int),
+    'ki': str,
+    'opc': str,
+    'op': str,
+    'sqn': int,
+    'iccid': str,
+    'msisdn': str,
+    'default_apn': str,
+    'apn': list,
+}
+
+def _validate_bulk_row(row: dict):
+    """ Check a bulk-add-subscribers entry has all required fields of the right types """
+    missing = [field for field in _BULK_REQUIRED_FIELDS if field not in row]
+    if missing:
+        raise click.BadParameter(f"Missing field {', '.join(missing)}")
+
+    for field, types in _BULK_FIELD_TYPES.items():
+        value = row.get(field)
+        if value is None:
+            continue
+        # bool is a subclass of int, but never a valid value
+        if isinstance(value, bool) or not isinstance(value, types):
+            raise click.BadParameter(f"Field {field} has the wrong type {type(value).__name__}")
+
+    if not all(isinstance(apn, str) for apn in row.get('apn') or []):
+        raise click.BadParameter("Field apn must be a list of APN names")
+
+def _bulk_add_subscriber(client: httpx.Client, apns: dict, row: dict, remove_old_auc: bool) -> dict:
+    """ Validate and add a single subscriber entry of bulk-add-subscribers """
+    _validate_bulk_row(row)
+    imsi = validate_imsi(None, None, str(row['imsi']))
+    ki = validate_key(None, None, row['ki'])
+    opc = validate_key(None, None, row.get('opc'))
+    op = validate_key(None, None, row.get('op'))
+    if opc and op:
+        raise click.BadParameter("Can't specify both OP and OPc!")
+    if not opc and not op:
+        raise click.BadParameter("Require either OP or OPc!")
+
+    old_sub_entry = get_subscriber(client, imsi)
+    old_auc_entry = get_auc(client, imsi)
+    return provision_subscriber(
+            client, apns, old_sub_entry, old_auc_entry,
+            imsi=imsi, ki=ki, opc=opc, op=op, sqn=row.get('sqn') or 0, iccid=row.get('iccid'),
+            msisdn=row.get('msisdn'), default_apn=row['default_apn'], apn=row.get('apn') or [],
+            remove_old_auc=remove_old_auc)
+
+@cli.command()
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--remove-old-auc', help='Remove old AUC entries if already present.', is_flag=True)
+@click.option('--jobs', help='Number of subscribers added concurrently.', default=16, type=click.IntRange(min=1))
+@click.pass_context
+def bulk_add_subscribers(ctx, path, remove_old_auc, jobs):
+    """ Add many subscribers from a json file
 
+        The file contains a list of subscriber objects with the keys
+        imsi, ki, opc or op, default_apn and optional sqn, iccid, msisdn and apn (a list of APNs).
+        The APN list is fetched once and all subscribers are added using the same connection pool.
+    """
+    import httpx
+
+    with open(path, 'rb') as json_file:
+        rows = orjson.loads(json_file.read())
+
+    if not isinstance(rows, list):
+        raise click.ClickException(f"{path} must contain a json list of subscribers.")
+
+    client = get_client(ctx)
+    apns = list_apns_dict(client)
+
+    # rows run concurrently, a repeated IMSI would pass the prechecks before the first is added
+    seen_imsis = set()
+    repeated = []
+    for row in rows:
+        imsi = str(row['imsi']) if isinstance(row, dict) and 'imsi' in row else None
+        repeated.append(imsi is not None and imsi in seen_imsis)
+        seen_imsis.add(imsi)
+
+    def add_row(row, is_repeated):
+        if not isinstance(row, dict):
+            return "Not a subscriber object"
+        if is_repeated:
+            return "IMSI is repeated, only its first entry is added"
+        # report every failure of a row, a single bad row must not abort the others
+        try:
+            _bulk_add_subscriber(client, apns, row, remove_old_auc)
+        except (RuntimeError, click.BadParameter, httpx.HTTPError, KeyError, TypeError, ValueError) as exp:
+            return str(exp) or type(exp).__name__
+        return None
+
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        errors = list(executor.map(add_row, rows, repeated))
+
+    failed = 0
+    for row, error in zip(rows, errors):
+        if error:
+            failed += 1
+            click.echo(f"{row.get('imsi') if isinstance(row, dict) else row}: {error}", err=True)
+
+    if failed:
+        raise click.ClickException(f"Added {len(rows) - failed} of {len(rows)} subscribers.")
+    click.echo(f"Added {len(rows)} of {len(rows)} subscribers.")
+
+@cli.command()
+@click.argument('imsi', type=str, callback=validate_imsi)
+@click.pass_context
+def remove_subscriber(ctx, imsi):
+    import httpx
+
+    client = get_client(ctx)
+
+    subscriber_obj = get_subscriber(client, imsi)
+    if not subscriber_obj:
+        raise click.ClickException(f"Couldn't find subscriber {imsi}. Does not exist!")
+
+    try:
+        resp = client.delete(f'/subscriber/{subscriber_obj["subscriber_id"]}')
         resp.raise_for_status()
-        sub_obj = resp.json()
+        result = orjson.loads(resp.content)
     except httpx.HTTPStatusError as exp:
-        if exp.response.status_code == 404:
-            return None
-        click.echo(f"Failed to get the subscriber {imsi} from Subscriber, PyHSS responded with HTTP {exp.response.status_code}. {exp.response.content}")
-        raise
+        raise click.ClickException(f"Failed to remove subscriber {imsi}, PyHSS responded with HTTP {exp.response.status_code}. {exp.response.content}") from exp
+    LOG.debug("Removing subscriber returned %s", result)
 
-    return sub_obj
+    if failed_result(result):
+        raise click.ClickException(f"Couldn't delete subscriber {imsi} / id {subscriber_obj['subscriber_id']}")
+
+def _get_or_none(client: httpx.Client, url: str, description: str) -> dict | None:
+    """ Get a single object from PyHSS, returns None if PyHSS doesn't know it """
+    import httpx
+
+    resp = client.get(url)
+    if resp.status_code == 404:
+        return None
 
-def get_auc(client, api, imsi) -> dict | None:
     try:
-        resp = client.get(f'{api}/auc/imsi/{imsi}')
         resp.raise_for_status()
-        auc_obj = resp.json()
     except httpx.HTTPStatusError as exp:
-        if exp.response.status_code == 404:
-            return None
-        click.echo(f"Failed to get the subscriber {imsi} from AUC, PyHSS responded with HTTP {exp.response.status_code}. {exp.response.content}")
+        click.echo(f"Failed to get {description}, PyHSS responded with HTTP {exp.response.status_code}. {exp.response.content}", err=True)
         raise
 
-    return auc_obj
+    return orjson.loads(resp.content)
+
+def get_subscriber(client, imsi) -> dict | None:
+    return _get_or_none(client, f'/subscriber/imsi/{imsi}', f"the subscriber {imsi} from Subscriber")
+
+def get_ims_subscriber(client, imsi=None, msisdn=None) -> dict | None:
+    if imsi:
+        return _get_or_none(client, f'/ims_subscriber/ims_subscriber_imsi/{imsi}', f"the IMS subscriber {imsi}")
+    if msisdn:
+        return _get_or_none(client, f'/ims_subscriber/ims_subscriber_msisdn/{msisdn}', f"the IMS subscriber with MSISDN {msisdn}")
+    return None
+
+def get_auc(client, imsi) -> dict | None:
+    return _get_or_none(client, f'/auc/imsi/{imsi}', f"the subscriber {imsi} from AUC")
+
+def get_page(client: httpx.Client, path: str, page: int, page_size: int) -> list:
+    """ Get a single page of a PyHSS list endpoint """
+    resp = client.get(path, params={'page_size': page_size, 'page': page})
+    resp.raise_for_status()
+    return orjson.loads(resp.content)
+
+def get_all_pages(client: httpx.Client, path: str, page_size: int, jobs: int = 8) -> list:
+    """ Get all entries of a PyHSS list endpoint
+
+        PyHSS doesn't tell the total amount of entries, so pages are fetched
+        concurrently in batches of jobs until a page is empty or shorter than
+        the first one. PyHSS may return less than page_size entries per page.
+    """
+    entries = []
+    full_page_len = None
+    first_page = 0
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        while True:
+            pages = executor.map(lambda page: get_page(client, path, page, page_size), range(first_page, first_page + jobs))
+            for page_entries in pages:
+                if full_page_len is None:
+                    full_page_len = len(page_entries)
+                entries.extend(page_entries)
+                if not page_entries or len(page_entries) < full_page_len:
+                    return entries
+            first_page += jobs
 
 def failed_result(result):
-    if not isinstance(result, dict):
-        return True
+    return not (isinstance(result, dict) and result.get('Result') == 'OK')
 
-    if 'Result' not in result or result['Result'] != 'OK':
-        return True
-    return False
+def delete_auc(client: httpx.Client, auc_id: str) -> dict | None:
+    import httpx
 
-def delete_auc(client: httpx.Client, api: str, auc_id: str) -> dict | None:
     try:
-        resp = client.delete(f'{api}/auc/{auc_id}')
+        resp = client.delete(f'/auc/{auc_id}')
         resp.raise_for_status()
-        result = resp.json()
+        result = orjson.loads(resp.content)
     except httpx.HTTPStatusError as exp:
-        click.echo(f"Failed to remove AUC entry id {auc_id} from AUC, PyHSS responded with HTTP {exp.response.status_code}. {exp.response.content}")
+        click.echo(f"Failed to remove AUC entry id {auc_id} from AUC, PyHSS responded with HTTP {exp.response.status_code}. {exp.response.content}", err=True)
         raise
 
     if failed_result(result):
         raise RuntimeError(f"Couldn't delete auc entry id {auc_id}. PyHSS responded {result}")
 
-def get_apn(client: httpx.Client, api: str, apn: str) -> dict | None:
-    apns = []
+def get_apn_list(client: httpx.Client) -> list:
+    """ Fetch all APNs with a single request """
+    import httpx
+
     try:
-        resp = client.get(f'{api}/apn/list')
+        resp = client.get('/apn/list')
         resp.raise_for_status()
-        apns = resp.json()
+        return orjson.loads(resp.content)
     except httpx.HTTPStatusError as exp:
-        click.echo(f"Failed to get the list of APNs, PyHSS responded with HTTP {exp.response.status_code}. {exp.response.content}")
+        click.echo(f"Failed to get the list of APNs, PyHSS responded with HTTP {exp.response.status_code}. {exp.response.content}", err=True)
         raise
 
-    results = list(filter(lambda entry: entry['apn'] == apn, apns))
-    if results:
-        return results[0]
-
-    # return apn
-    return None
+def list_apns_dict(client: httpx.Client) -> dict:
+    """ Fetch all APNs and return them keyed by APN name
 
-_CONVERT_BIT_RE = re.compile(r'[ ]*(?P<bw>[0-9]+)[ ]?(?P<unit>[kmg]?bit)?')
+        APN names are not unique in PyHSS, the first APN of a name is used.
+    """
+    apns_by_name = {}
+    for entry in get_apn_list(client):
+        apns_by_name.setdefault(entry['apn'], entry)
+    return apns_by_name
+
+def get_apn(client: httpx.Client, apn: str) -> dict | None:
+    """ Find an APN by its name, PyHSS has no endpoint to get a single APN by name """
+    return list_apns_dict(client).get(apn)
+
+# longest suffix first, 'bit' is also the suffix of all others
+_BIT_UNITS = (
+    ('gbit', 1_000_000_000),
+    ('mbit', 1_000_000),
+    ('kbit', 1_000),
+    ('bit', 1),
+)
 def convert_mbit(bandwidth: str) -> int:
     """ bandwidth maybe '100mbit' or 100 or 1gbit or '1 gbit' """
-    bits = {
-        'bit': 0,
-        'kbit': 3,
-        'mbit': 6,
-        'gbit': 9,
-    }
-
-    bandwidth = bandwidth.lower()
-    match = _CONVERT_BIT_RE.match(bandwidth)
-    if not match:
+    value = bandwidth.strip().lower().replace(' ', '')
+    multiplier = 1
+    for unit, unit_multiplier in _BIT_UNITS:
+        if value.endswith(unit):
+            value = value[:-len(unit)]
+            multiplier = unit_multiplier
+            break
+
+    if not value.isdigit():
         raise ValueError("Input doesn't match bandwidth string. E.g. '100mbit'")
 
-    value, unit = match.groups()
-    if unit:
-        expo = bits[unit]
-    else:
-        expo = 0
-
-    return int(value) * (10 ** expo)
+    return int(value) * multiplier
 
 @cli.command()
 @click.argument('apn', type=str)
@@ -307,92 +476,93 @@ def convert_mbit(bandwidth: str) -> int:
 @click.option('--preemption-vuln', default=True, help='APN is (ARP) preemption vulnerable. It can be preemted and other PDNs will get more bandwdith.', type=bool)
 @click.pass_context
 def add_apn(ctx, apn, dl, ul, qci, arp, preemption_cap, preemption_vuln):
-    # try to find the apn with the name
-
-    with httpx.Client(headers=get_headers(ctx)) as client:
-        api = ctx.obj['API']
+    import httpx
 
-        apn_obj = get_apn(client, api, apn)
-        if apn_obj:
-            LOG.debug("Found apn entry %s.", apn_obj)
-            click.echo(f"APN {apn} already exists (apn_id: {apn_obj['apn_id']})!")
-            sys.exit(1)
-
-        apn_obj = {
-            'apn': apn,
-            'apn_ambr_dl': convert_mbit(dl),
-            'apn_ambr_ul': convert_mbit(ul),
-            'qci': qci,
-            'arp_priority': arp,
-            'arp_preemption_vulnerability': preemption_vuln,
-            'arp_preemption_capability': preemption_cap,
-        }
+    # try to find the apn with the name
+    client = get_client(ctx)
+
+    apn_obj = get_apn(client, apn)
+    if apn_obj:
+        LOG.debug("Found apn entry %s.", apn_obj)
+        raise click.ClickException(f"APN {apn} already exists (apn_id: {apn_obj['apn_id']})!")
+
+    apn_obj = {
+        'apn': apn,
+        'apn_ambr_dl': convert_mbit(dl),
+        'apn_ambr_ul': convert_mbit(ul),
+        'qci': qci,
+        'arp_priority': arp,
+        'arp_preemption_vulnerability': preemption_vuln,
+        'arp_preemption_capability': preemption_cap,
+    }
 
-        try:
-            resp = client.put(f'{api}/apn/', json=apn_obj)
-            apn_obj = resp.json()
-            resp.raise_for_status()
-        except httpx.HTTPStatusError as exp:
-            click.echo(f"Failed to add the APN {apn}, PyHSS responded with HTTP {exp.response.status_code}")
-            sys.exit(1)
+    try:
+        resp = client.put('/apn/', content=orjson.dumps(apn_obj), headers={'Content-Type': 'application/json'})
+        resp.raise_for_status()
+        apn_obj = orjson.loads(resp.content)
+    except httpx.HTTPStatusError as exp:
+        raise click.ClickException(f"Failed to add the APN {apn}, PyHSS responded with HTTP {exp.response.status_code}") from exp
 
-        LOG.debug("APN added: %s", apn_obj)
-        click.echo(f"APN {apn} added under id: {apn_obj['apn_id']}")
+    LOG.debug("APN added: %s", apn_obj)
+    click.echo(f"APN {apn} added under id: {apn_obj['apn_id']}")
 
 @cli.command()
 @click.argument('apn', type=str)
 @click.pass_context
 def remove_apn(ctx, apn):
-    with httpx.Client(headers=get_headers(ctx)) as client:
-        api = ctx.obj['API']
+    import httpx
 
-        apn_obj = get_apn(client, api, apn)
-        if not apn_obj:
-            click.echo(f"Couldn't find apn {apn}. Does not exist!")
-            sys.exit(1)
+    client = get_client(ctx)
 
-        try:
-            resp = client.delete(f'{api}/apn/{apn_obj["apn_id"]}')
-            resp_obj = resp.json()
-            resp.raise_for_status()
-        except httpx.HTTPStatusError as exp:
-            click.echo(f"Failed to remove apn {apn}, PyHSS responded with HTTP {exp.response.status_code}. {exp.response.content}")
-            sys.exit(1)
-        LOG.debug("Removing APN returned %s", resp_obj)
+    apn_obj = get_apn(client, apn)
+    if not apn_obj:
+        raise click.ClickException(f"Couldn't find apn {apn}. Does not exist!")
+
+    try:
+        resp = client.delete(f'/apn/{apn_obj["apn_id"]}')
+        resp.raise_for_status()
+        resp_obj = orjson.loads(resp.content)
+    except httpx.HTTPStatusError as exp:
+        raise click.ClickException(f"Failed to remove apn {apn}, PyHSS responded with HTTP {exp.response.status_code}. {exp.response.content}") from exp
+    LOG.debug("Removing APN returned %s", resp_obj)
 
 @cli.command()
 @click.option('--imsi', 'imsi', help='Show only a single subscriber.')
 @click.option('-l', 'display', flag_value='long', help='Long output, show all fields.')
 @click.option('-b', 'display', flag_value='brief', help='brief output, show AMBR, MSISDN, enabled, roaming_enabled, default_apn')
 @click.option('-i', 'display', flag_value='imsi', help='Show only the imsi of a subscriber')
-@click.option('--limit', help='Limit output of subscribers', default=100, type=int)
+@click.option('--limit', help='Limit output of subscribers', default=100, type=click.IntRange(min=1))
 @click.option('--page', help='Page through subscribers', default=0, type=int)
+@click.option('--all', 'fetch_all', help='Show all subscribers by fetching all pages concurrently, --limit is used as page size.', is_flag=True)
 @click.pass_context
-def list_subscribers(ctx, imsi, display, page, limit):
+def list_subscribers(ctx, imsi, display, page, limit, fetch_all):
     """ list subscribers
 
         The brief output shows AMBR, MSISDN, enabled, roaming_enabled, default_apn.
         The long output shows all properties.
         The imsi output only shows only a single line
     """
+    import httpx
 
-    with httpx.Client(headers=get_headers(ctx)) as client:
-        api = ctx.obj['API']
+    if fetch_all and ctx.get_parameter_source('page') != click.core.ParameterSource.DEFAULT:
+        raise click.ClickException("Can't use both --page and --all.")
 
-        if imsi:
-            subscriber = get_subscriber(client, api, imsi)
-            if not subscriber:
-                click.echo(f"Couldn't find subscriber {imsi}")
-                sys.exit(1)
-            subscribers = [subscriber]
-        else:
-            try:
-                resp = client.get(f'{api}/subscriber/list', params={'page_size': limit, 'page': page})
-                resp.raise_for_status()
-                subscribers = resp.json()
-            except httpx.HTTPStatusError as exp:
-                click.echo(f"Failed to list subscribers, PyHSS responded with HTTP {exp.response.status_code}. {exp.response.content}")
-                raise
+    client = get_client(ctx)
+
+    if imsi:
+        subscriber = get_subscriber(client, imsi)
+        if not subscriber:
+            raise click.ClickException(f"Couldn't find subscriber {imsi}")
+        subscribers = [subscriber]
+    else:
+        try:
+            if fetch_all:
+                subscribers = get_all_pages(client, '/subscriber/list', limit)
+            else:
+                subscribers = get_page(client, '/subscriber/list', page, limit)
+        except httpx.HTTPStatusError as exp:
+            click.echo(f"Failed to list subscribers, PyHSS responded with HTTP {exp.response.status_code}. {exp.response.content}", err=True)
+            raise
 
     # TODO: sorting of fields
     # TODO: resolve default apn and apn list
@@ -406,6 +576,9 @@ def list_subscribers(ctx, imsi, display, page, limit):
         'roaming_enabled',
     ]
 
+    if not subscribers:
+        return
+
     # No display option is selected
     if not display:
         if imsi:
@@ -413,22 +586,18 @@ def list_subscribers(ctx, imsi, display, page, limit):
         else:
             display = 'imsi'
 
+    # collect all lines to write the output at once
     if display == 'long':
-        for sub in subscribers:
-            for field in sub:
-                if field == 'imsi':
-                    continue
-
-                click.echo(f"{sub['imsi']}, {field}: {sub[field]}")
-
+        # all subscribers share the same fields
+        long_fields = [field for field in subscribers[0] if field != 'imsi']
+        lines = [f"{sub['imsi']}, {field}: {sub[field]}" for sub in subscribers for field in long_fields]
     elif display == 'brief':
-        for sub in subscribers:
-            for field in brief_fields:
-                click.echo(f"{sub['imsi']}, {field}: {sub[field]}")
+        lines = [f"{sub['imsi']}, {field}: {sub[field]}" for sub in subscribers for field in brief_fields]
+    else:
+        lines = [f"{sub['imsi']}" for sub in subscribers]
 
-    elif display == 'imsi':
-        for sub in subscribers:
-            click.echo(f"{sub['imsi']}")
+    if lines:
+        click.echo('\n'.join(lines))
 
 
 @cli.command()
@@ -444,24 +613,15 @@ def list_apns(ctx, apn, display):
         The long output shows all properties.
         The id output only shows only a single line
     """
+    client = get_client(ctx)
 
-    with httpx.Client(headers=get_headers(ctx)) as client:
-        api = ctx.obj['API']
-
-        if apn:
-            apns = get_apn(client, api, apn)
-            if not apns:
-                click.echo(f"Couldn't find APN {apn}")
-                sys.exit(1)
-            apns = [apns]
-        else:
-            try:
-                resp = client.get(f'{api}/apn/list')
-                resp.raise_for_status()
-                apns = resp.json()
-            except httpx.HTTPStatusError as exp:
-                click.echo(f"Failed to list apns, PyHSS responded with HTTP {exp.response.status_code}. {exp.response.content}")
-                raise
+    if apn:
+        apns = get_apn(client, apn)
+        if not apns:
+            raise click.ClickException(f"Couldn't find APN {apn}")
+        apns = [apns]
+    else:
+        apns = get_apn_list(client)
 
     brief_fields = [
         'apn_id',
@@ -473,6 +633,9 @@ def list_apns(ctx, apn, display):
         'qci',
     ]
 
+    if not apns:
+        return
+
     # No display option is selected
     if not display:
         if apn:
@@ -480,20 +643,18 @@ def list_apns(ctx, apn, display):
         else:
             display = 'id'
 
+    # collect all lines to write the output at once
     if display == 'long':
-        for _apn in apns:
-            for field in _apn:
-                if field == 'apn':
-                    continue
-
-                click.echo(f"{apn['apn']}, {field}: {apn[field]}")
+        # all APNs share the same fields
+        long_fields = [field for field in apns[0] if field != 'apn']
+        lines = [f"{_apn['apn']}, {field}: {_apn[field]}" for _apn in apns for field in long_fields]
     elif display == 'brief':
-        for _apn in apns:
-            for field in brief_fields:
-                click.echo(f"{_apn['apn']}, {field}: {_apn[field]}")
-    elif display == 'id':
-        for _apn in apns:
-            click.echo(f"{_apn['apn']}: id {_apn['apn_id']}")
+        lines = [f"{_apn['apn']}, {field}: {_apn[field]}" for _apn in apns for field in brief_fields]
+    else:
+        lines = [f"{_apn['apn']}: id {_apn['apn_id']}" for _apn in apns]
+
+    if lines:
+        click.echo('\n'.join(lines))
 
 @cli.command()
 @click.argument('imsi', type=str)
@@ -501,62 +662,57 @@ def list_apns(ctx, apn, display):
 @click.option('--ifc', help='ICF (Initial Filter Criteria) path to the xml on the HSS', default='default_ifc.xml', type=str)
 @click.pass_context
 def add_ims_subscriber(ctx, imsi, msisdn, ifc):
+    import httpx
 
-    with httpx.Client(headers=get_headers(ctx)) as client:
-        api = ctx.obj['API']
+    client = get_client(ctx)
 
-        sub_obj = get_subscriber(client, api, imsi)
-        if not sub_obj:
-            click.echo(f"Couldn't find the subscriber {imsi} in the subscriber DB! Please add the subscriber with `add-subscriber`")
-            sys.exit(1)
+    sub_obj = get_subscriber(client, imsi)
+    if not sub_obj:
+        raise click.ClickException(f"Couldn't find the subscriber {imsi} in the subscriber DB! Please add the subscriber with `add-subscriber`")
 
-        primary_msisdn = msisdn[0]
-        additional = list(msisdn)[1:]
-        additional = [str(x) for x in additional]
-        additional = ','.join(additional)
+    primary_msisdn = msisdn[0]
+    additional = ','.join(map(str, msisdn[1:]))
 
-        ims_obj = {
-            'imsi': imsi,
-            'msisdn': primary_msisdn,
-            'msisdn_list': additional,
-            'ifc_path': ifc,
-        }
+    ims_obj = {
+        'imsi': imsi,
+        'msisdn': primary_msisdn,
+        'msisdn_list': additional,
+        'ifc_path': ifc,
+    }
 
-        try:
-            resp = client.put(f'{api}/ims_subscriber/', json=ims_obj)
-            subscriber_obj = resp.json()
-            resp.raise_for_status()
-        except httpx.HTTPStatusError as exp:
-            click.echo(f"Failed to add the IMS subscriber {imsi}, PyHSS responded with HTTP {exp.response.status_code} {exp.response.content}")
-            sys.exit(1)
+    try:
+        resp = client.put('/ims_subscriber/', content=orjson.dumps(ims_obj), headers={'Content-Type': 'application/json'})
+        resp.raise_for_status()
+        subscriber_obj = orjson.loads(resp.content)
+    except httpx.HTTPStatusError as exp:
+        raise click.ClickException(f"Failed to add the IMS subscriber {imsi}, PyHSS responded with HTTP {exp.response.status_code} {exp.response.content}") from exp
 
-        LOG.debug("IMS Subscriber added: %s", subscriber_obj)
-        click.echo(f"IMS subscriber {imsi} added under id: {subscriber_obj['ims_subscriber_id']}")
+    LOG.debug("IMS Subscriber added: %s", subscriber_obj)
+    click.echo(f"IMS subscriber {imsi} added under id: {subscriber_obj['ims_subscriber_id']}")
 
 @cli.command()
 @click.argument('imsi', type=str)
 @click.pass_context
 def remove_ims_subscriber(ctx, imsi):
-    with httpx.Client(headers=get_headers(ctx)) as client:
-        api = ctx.obj['API']
+    import httpx
 
-        ims_obj = get_ims_subscriber(client, api, imsi)
-        if not ims_obj:
-            click.echo(f"Couldn't find IMS subscriber {imsi}. Does not exist!")
-            sys.exit(1)
-        print(f"Found subscriber {ims_obj}")
+    client = get_client(ctx)
 
-        try:
-            resp = client.delete(f'{api}/ims_subscriber/{ims_obj["ims_subscriber_id"]}')
-            result = resp.json()
-            resp.raise_for_status()
-        except httpx.HTTPStatusError as exp:
-            click.echo(f"Failed to remove IMS subscriber {imsi}, PyHSS responded with HTTP {exp.response.status_code}. {exp.response.content}")
-            sys.exit(1)
+    ims_obj = get_ims_subscriber(client, imsi)
+    if not ims_obj:
+        raise click.ClickException(f"Couldn't find IMS subscriber {imsi}. Does not exist!")
+    LOG.debug("Found IMS subscriber %s", ims_obj)
+
+    try:
+        resp = client.delete(f'/ims_subscriber/{ims_obj["ims_subscriber_id"]}')
+        resp.raise_for_status()
+        result = orjson.loads(resp.content)
+    except httpx.HTTPStatusError as exp:
+        raise click.ClickException(f"Failed to remove IMS subscriber {imsi}, PyHSS responded with HTTP {exp.response.status_code}. {exp.response.content}") from exp
 
     LOG.debug("Removing ims returned %s", result)
     if failed_result(result):
-        raise RuntimeError(f"Couldn't delete IMS subscriber {imsi} / id {ims_obj['ims_subscriber_id']}")
+        raise click.ClickException(f"Couldn't delete IMS subscriber {imsi} / id {ims_obj['ims_subscriber_id']}")
 
 @cli.command()
 @click.option('--imsi', 'imsi', help='Show only a single subscriber by IMSI.')
@@ -574,34 +730,31 @@ def list_ims_subscribers(ctx, imsi, msisdn, display, page, limit):
         The long output shows all properties.
         The id output only shows only a single line
     """
+    import httpx
 
     if imsi and msisdn:
-        click.echo("Can't use both --imsi and --msisdn to filter for an IMS subscriber.")
-        sys.exit(1)
-
-    with httpx.Client(headers=get_headers(ctx)) as client:
-        api = ctx.obj['API']
-
-        if imsi:
-            subscriber = get_ims_subscriber(client, api, imsi=imsi)
-            if not subscriber:
-                click.echo(f"Couldn't find subscriber by IMSI {imsi}")
-                sys.exit(1)
-            subscribers = [subscriber]
-        elif msisdn:
-            subscriber = get_ims_subscriber(client, api, msisdn=msisdn)
-            if not subscriber:
-                click.echo(f"Couldn't find subscriber by MSISDN {msisdn}")
-                sys.exit(1)
-            subscribers = [subscriber]
-        else:
-            try:
-                resp = client.get(f'{api}/ims_subscriber/list', params={'page_size': limit, 'page': page})
-                resp.raise_for_status()
-                subscribers = resp.json()
-            except httpx.HTTPStatusError as exp:
-                click.echo(f"Failed to list IMS subscribers, PyHSS responded with HTTP {exp.response.status_code}. {exp.response.content}")
-                raise
+        raise click.ClickException("Can't use both --imsi and --msisdn to filter for an IMS subscriber.")
+
+    client = get_client(ctx)
+
+    if imsi:
+        subscriber = get_ims_subscriber(client, imsi=imsi)
+        if not subscriber:
+            raise click.ClickException(f"Couldn't find subscriber by IMSI {imsi}")
+        subscribers = [subscriber]
+    elif msisdn:
+        subscriber = get_ims_subscriber(client, msisdn=msisdn)
+        if not subscriber:
+            raise click.ClickException(f"Couldn't find subscriber by MSISDN {msisdn}")
+        subscribers = [subscriber]
+    else:
+        try:
+            resp = client.get('/ims_subscriber/list', params={'page_size': limit, 'page': page})
+            resp.raise_for_status()
+            subscribers = orjson.loads(resp.content)
+        except httpx.HTTPStatusError as exp:
+            click.echo(f"Failed to list IMS subscribers, PyHSS responded with HTTP {exp.response.status_code}. {exp.response.content}", err=True)
+            raise
 
     # TODO: sorting of fields
     brief_fields = [
@@ -614,6 +767,9 @@ def list_ims_subscribers(ctx, imsi, msisdn, display, page, limit):
         'scscf_timestamp',
     ]
 
+    if not subscribers:
+        return
+
     # No display option is selected
     if not display:
         if imsi:
@@ -621,19 +777,15 @@ def list_ims_subscribers(ctx, imsi, msisdn, display, page, limit):
         else:
             display = 'imsi'
 
+    # collect all lines to write the output at once
     if display == 'long':
-        for sub in subscribers:
-            for field in sub:
-                if field == 'imsi':
-                    continue
-
-                click.echo(f"{sub['imsi']}, {field}: {sub[field]}")
-
+        # all subscribers share the same fields
+        long_fields = [field for field in subscribers[0] if field != 'imsi']
+        lines = [f"{sub['imsi']}, {field}: {sub[field]}" for sub in subscribers for field in long_fields]
     elif display == 'brief':
-        for sub in subscribers:
-            for field in brief_fields:
-                click.echo(f"{sub['imsi']}, {field}: {sub[field]}")
+        lines = [f"{sub['imsi']}, {field}: {sub[field]}" for sub in subscribers for field in brief_fields]
+    else:
+        lines = [f"{sub['imsi']}" for sub in subscribers]
 
-    elif display == 'imsi':
-        for sub in subscribers:
-            click.echo(f"{sub['imsi']}")
+    if lines:
+        click.echo('\n'.join(lines))
@@ -0,0 +1,82 @@
+import json
+import re
+
+import httpx
+from click.testing import CliRunner
+
+from pyhss_cli.cli import cli
+
+KEY = '00112233445566778899aabbccddeeff'
+
+
+class DuplicateApnPyHSS:
+    """ A PyHSS with two APNs sharing the name internet, PyHSS doesn't enforce unique names """
+
+    def __init__(self):
+        self.apns = [
+            {'apn_id': 1, 'apn': 'internet'},
+            {'apn_id': 2, 'apn': 'internet'},
+            {'apn_id': 3, 'apn': 'ims'},
+        ]
+        self.subscribers = {}
+        self.requests = []
+
+    def handle(self, request: httpx.Request) -> httpx.Response:
+        path = request.url.path
+        self.requests.append(f'{request.method} {path}')
+        if request.method == 'GET' and path == '/apn/list':
+            return httpx.Response(200, json=self.apns)
+
+        match = re.fullmatch(r'/apn/(\d+)', path)
+        if request.method == 'DELETE' and match:
+            self.apns = [apn for apn in self.apns if apn['apn_id'] != int(match.group(1))]
+            return httpx.Response(200, json={'Result': 'OK'})
+
+        if request.method == 'GET' and re.fullmatch(r'/(subscriber|auc)/imsi/\d+', path):
+            return httpx.Response(404, json={'Result': 'Not Found'})
+
+        if request.method == 'PUT' and path in ('/auc/', '/subscriber/'):
+            entry = json.loads(request.content)
+            entry['auc_id'] = entry['subscriber_id'] = 1
+            if path == '/subscriber/':
+                self.subscribers[entry['imsi']] = entry
+            return httpx.Response(200, json=entry)
+
+        return httpx.Response(404, json={'message': 'path not found'})
+
+
+def invoke(pyhss, *args):
+    client = httpx.Client(transport=httpx.MockTransport(pyhss.handle), base_url='http://pyhss')
+    return CliRunner().invoke(cli, list(args), obj={'CLIENT': client})
+
+
+def test_add_subscriber_uses_first_apn():
+    pyhss = DuplicateApnPyHSS()
+    result = invoke(pyhss, 'add-subscriber', '999420000000010', '--ki', KEY, '--opc', KEY, '--default-apn', 'internet')
+
+    assert result.exit_code == 0, result.output
+    assert pyhss.subscribers['999420000000010']['default_apn'] == 1
+
+
+def test_add_apn_reports_first_apn():
+    pyhss = DuplicateApnPyHSS()
+    result = invoke(pyhss, 'add-apn', 'internet')
+
+    assert result.exit_code == 1
+    assert 'APN internet already exists (apn_id: 1)!' in result.output
+    assert pyhss.requests == ['GET /apn/list']
+
+
+def test_remove_apn_removes_first_apn():
+    pyhss = DuplicateApnPyHSS()
+    result = invoke(pyhss, 'remove-apn', 'internet')
+
+    assert result.exit_code == 0, result.output
+    assert 'DELETE /apn/1' in pyhss.requests
+
+
+def test_list_apns_shows_all_apns():
+    result = invoke(DuplicateApnPyHSS(), 'list-apns')
+
+    assert result.exit_code == 0, result.output
+    assert result.output.splitlines() == ['internet: id 1', 'internet: id 2', 'ims: id 3']
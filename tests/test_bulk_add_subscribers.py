@@ -0,0 +1,132 @@
+import json
+import re
+
+import httpx
+import pytest
+from click.testing import CliRunner
+
+from pyhss_cli.cli import cli
+
+KEY = '00112233445566778899aabbccddeeff'
+
+
+class FakePyHSS:
+    """ A minimal in-memory PyHSS answering the requests of bulk-add-subscribers """
+
+    def __init__(self, fail_auc_put=None):
+        self.apns = [
+            {'apn_id': 1, 'apn': 'internet'},
+            {'apn_id': 2, 'apn': 'ims'},
+        ]
+        self.subscribers = {'999420000000001': {'subscriber_id': 1, 'imsi': '999420000000001'}}
+        self.aucs = {}
+        self.fail_auc_put = fail_auc_put or set()
+
+    def handle(self, request: httpx.Request) -> httpx.Response:
+        path = request.url.path
+        if request.method == 'GET' and path == '/apn/list':
+            return httpx.Response(200, json=self.apns)
+
+        match = re.fullmatch(r'/(subscriber|auc)/imsi/(\d+)', path)
+        if request.method == 'GET' and match:
+            table = self.subscribers if match.group(1) == 'subscriber' else self.aucs
+            if match.group(2) in table:
+                return httpx.Response(200, json=table[match.group(2)])
+            return httpx.Response(404, json={'Result': 'Not Found'})
+
+        if request.method == 'PUT' and path == '/auc/':
+            entry = json.loads(request.content)
+            if entry['imsi'] in self.fail_auc_put:
+                return httpx.Response(500, text='<html>Internal Server Error</html>')
+            entry['auc_id'] = len(self.aucs) + 100
+            self.aucs[entry['imsi']] = entry
+            return httpx.Response(200, json=entry)
+
+        if request.method == 'PUT' and path == '/subscriber/':
+            entry = json.loads(request.content)
+            entry['subscriber_id'] = len(self.subscribers) + 1
+            self.subscribers[entry['imsi']] = entry
+            return httpx.Response(200, json=entry)
+
+        return httpx.Response(404, json={'message': 'path not found'})
+
+
+def run_bulk(tmp_path, rows, pyhss):
+    path = tmp_path / 'subscribers.json'
+    path.write_text(json.dumps(rows))
+    client = httpx.Client(transport=httpx.MockTransport(pyhss.handle), base_url='http://pyhss')
+    return CliRunner().invoke(cli, ['bulk-add-subscribers', str(path)], obj={'CLIENT': client})
+
+
+def row(imsi, **fields):
+    return {'imsi': imsi, 'ki': KEY, 'opc': KEY, 'default_apn': 'internet', **fields}
+
+
+def test_bulk_add_subscribers(tmp_path):
+    pyhss = FakePyHSS()
+    result = run_bulk(tmp_path, [
+        row('999420000000010', apn=['ims'], msisdn='10', sqn=5),
+        row(999420000000011),
+    ], pyhss)
+
+    assert result.exit_code == 0, result.output
+    assert 'Added 2 of 2 subscribers.' in result.output
+    assert pyhss.subscribers['999420000000010']['apn_list'] == '2'
+    assert pyhss.subscribers['999420000000010']['msisdn'] == '10'
+    assert pyhss.aucs['999420000000010']['sqn'] == 5
+    assert pyhss.aucs['999420000000011']['sqn'] == 0
+
+
+@pytest.mark.parametrize('bad_row, error', [
+    (row('999420000000020', ki=1234), 'Field ki has the wrong type int'),
+    (row('999420000000020', apn='ims'), 'Field apn has the wrong type str'),
+    (row('999420000000020', apn=[1]), 'Field apn must be a list of APN names'),
+    (row('999420000000020', sqn='5'), 'Field sqn has the wrong type str'),
+    (row('999420000000020', sqn=True), 'Field sqn has the wrong type bool'),
+    ({'imsi': '999420000000020', 'opc': KEY}, 'Missing field ki, default_apn'),
+    (row('99942000000002x'), 'Contains the following invalid IMSI characters: x'),
+    (row('999420000000020', default_apn='nope'), "Could not find the default apn 'nope'"),
+    (row('999420000000001'), 'Subscriber already exist in subscriber database!'),
+    (42, 'Not a subscriber object'),
+])
+def test_bulk_add_subscribers_bad_row(tmp_path, bad_row, error):
+    pyhss = FakePyHSS()
+    result = run_bulk(tmp_path, [bad_row, row('999420000000021')], pyhss)
+
+    assert result.exit_code == 1
+    assert error in result.output
+    assert 'Added 1 of 2 subscribers.' in result.output
+    assert '999420000000021' in pyhss.subscribers
+    assert '999420000000020' not in pyhss.subscribers
+
+
+def test_bulk_add_subscribers_server_error(tmp_path):
+    pyhss = FakePyHSS(fail_auc_put={'999420000000030'})
+    result = run_bulk(tmp_path, [row('999420000000030'), row('999420000000031')], pyhss)
+
+    assert result.exit_code == 1
+    assert '999420000000030: Failed to add the subscriber 999420000000030 to the AUC, PyHSS responded with HTTP 500' in result.output
+    assert 'Added 1 of 2 subscribers.' in result.output
+    assert '999420000000031' in pyhss.subscribers
+
+
+def test_bulk_add_subscribers_no_list(tmp_path):
+    result = run_bulk(tmp_path, {'imsi': '999420000000040'}, FakePyHSS())
+
+    assert result.exit_code == 1
+    assert 'must contain a json list of subscribers' in result.output
+
+
+def test_bulk_add_subscribers_repeated_imsi(tmp_path):
+    pyhss = FakePyHSS()
+    result = run_bulk(tmp_path, [
+        row('999420000000050', msisdn='50'),
+        row(999420000000050, msisdn='51'),
+        row('999420000000051'),
+    ], pyhss)
+
+    assert result.exit_code == 1
+    assert '999420000000050: IMSI is repeated, only its first entry is added' in result.output
+    assert 'Added 2 of 3 subscribers.' in result.output
+    assert pyhss.subscribers['999420000000050']['msisdn'] == '50'
+    assert len(pyhss.aucs) == 2
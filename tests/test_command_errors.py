@@ -0,0 +1,58 @@
+import httpx
+import pytest
+from click.testing import CliRunner
+
+from pyhss_cli.cli import cli
+
+IMSI = '999420000000001'
+
+FOUND = {
+    '/subscriber/imsi/999420000000001': {'subscriber_id': 1, 'imsi': IMSI},
+    '/ims_subscriber/ims_subscriber_imsi/999420000000001': {'ims_subscriber_id': 1, 'imsi': IMSI},
+    '/apn/list': [{'apn_id': 1, 'apn': 'internet'}],
+}
+
+
+def pyhss_answering_writes(response):
+    """ A PyHSS finding all objects, but answering every PUT and DELETE with response """
+
+    def handle(request: httpx.Request) -> httpx.Response:
+        if request.method != 'GET':
+            return response
+        if request.url.path in FOUND:
+            return httpx.Response(200, json=FOUND[request.url.path])
+        return httpx.Response(404, json={'Result': 'Not Found'})
+
+    return handle
+
+
+def invoke(handler, args):
+    client = httpx.Client(transport=httpx.MockTransport(handler), base_url='http://pyhss')
+    return CliRunner().invoke(cli, args, obj={'CLIENT': client})
+
+
+@pytest.mark.parametrize('args, error', [
+    (['remove-subscriber', IMSI], f'Failed to remove subscriber {IMSI}, PyHSS responded with HTTP 500'),
+    (['remove-apn', 'internet'], 'Failed to remove apn internet, PyHSS responded with HTTP 500'),
+    (['add-apn', 'ims'], 'Failed to add the APN ims, PyHSS responded with HTTP 500'),
+    (['add-ims-subscriber', IMSI, '--msisdn', '10'], f'Failed to add the IMS subscriber {IMSI}, PyHSS responded with HTTP 500'),
+    (['remove-ims-subscriber', IMSI], f'Failed to remove IMS subscriber {IMSI}, PyHSS responded with HTTP 500'),
+])
+def test_server_error(args, error):
+    result = invoke(pyhss_answering_writes(httpx.Response(500, text='<html>Internal Server Error</html>')), args)
+
+    assert result.exit_code == 1
+    assert isinstance(result.exception, SystemExit)
+    assert error in result.output
+
+
+@pytest.mark.parametrize('args, error', [
+    (['remove-subscriber', IMSI], f"Couldn't delete subscriber {IMSI} / id 1"),
+    (['remove-ims-subscriber', IMSI], f"Couldn't delete IMS subscriber {IMSI} / id 1"),
+])
+def test_failed_result(args, error):
+    result = invoke(pyhss_answering_writes(httpx.Response(200, json={'Result': 'Failed'})), args)
+
+    assert result.exit_code == 1
+    assert isinstance(result.exception, SystemExit)
+    assert error in result.output
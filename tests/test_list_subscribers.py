@@ -0,0 +1,58 @@
+import httpx
+import pytest
+from click.testing import CliRunner
+
+from pyhss_cli.cli import cli
+
+SUBSCRIBERS = [{'subscriber_id': i, 'imsi': f'99942000000{i:04d}'} for i in range(25)]
+
+
+def paged_pyhss(max_page_size):
+    """ A PyHSS serving /subscriber/list with at most max_page_size entries per page """
+    requested_pages = []
+
+    def handle(request: httpx.Request) -> httpx.Response:
+        assert request.url.path == '/subscriber/list'
+        page = int(request.url.params['page'])
+        page_size = min(int(request.url.params['page_size']), max_page_size)
+        requested_pages.append(page)
+        return httpx.Response(200, json=SUBSCRIBERS[page * page_size:(page + 1) * page_size])
+
+    return handle, requested_pages
+
+
+def list_subscribers(handler, *args):
+    client = httpx.Client(transport=httpx.MockTransport(handler), base_url='http://pyhss')
+    return CliRunner().invoke(cli, ['list-subscribers', *args], obj={'CLIENT': client})
+
+
+@pytest.mark.parametrize('limit, max_page_size', [
+    (10, 100),
+    (25, 100),
+    (100, 100),
+    (25, 5),
+])
+def test_list_all_subscribers(limit, max_page_size):
+    handler, _pages = paged_pyhss(max_page_size)
+    result = list_subscribers(handler, '--all', '--limit', str(limit))
+
+    assert result.exit_code == 0, result.output
+    assert result.output.split() == [sub['imsi'] for sub in SUBSCRIBERS]
+
+
+@pytest.mark.parametrize('limit', ['0', '-1'])
+def test_list_all_subscribers_invalid_limit(limit):
+    handler, pages = paged_pyhss(100)
+    result = list_subscribers(handler, '--all', '--limit', limit)
+
+    assert result.exit_code == 2
+    assert not pages
+
+
+def test_list_all_subscribers_with_page():
+    handler, pages = paged_pyhss(100)
+    result = list_subscribers(handler, '--all', '--page', '1')
+
+    assert result.exit_code == 1
+    assert "Can't use both --page and --all." in result.output
+    assert not pages